@@ -1,59 +1,145 @@
+import multiprocessing
 import os
 import time
 from flask import Flask
-from threading import Thread
-from faker import Faker
 import random
-import json
+import orjson
 from logtail import LogtailHandler
+from logtail.uploader import Uploader
+import msgpack
 import logging
+import logging.handlers
 
 app = Flask(__name__)
 
+# Log generation runs in a forked child process so it never competes with
+# Flask's request handling for the GIL
+mp_context = multiprocessing.get_context('fork')
+
 running = True  # Start log generation by default
-log_count = 0
-handler = LogtailHandler(source_token=os.getenv('LOGTAIL_SOURCE_TOKEN'))
-handler2 = LogtailHandler(source_token=os.getenv('LOGTAIL_SOURCE_TOKEN_2'))
+log_count = mp_context.Value('Q', 0)  # Shared with the generator process
+LOG_INTERVAL = 0.05  # Emit a log every 50ms
+
+# LogtailHandler already ships records in batches (one msgpack POST per flush);
+# these control the batch size and how long a partial batch may wait
+buffer_capacity = int(os.getenv('LOGTAIL_BUFFER_CAPACITY', '1000'))
+flush_interval = float(os.getenv('LOGTAIL_FLUSH_INTERVAL', '1'))
+upload_timeout = float(os.getenv('LOGTAIL_UPLOAD_TIMEOUT', '2'))
+
+
+class TimeoutUploader(Uploader):
+    # The stock Uploader posts without a timeout, so a stalled endpoint would
+    # hang the flush thread forever. With a timeout the batch is abandoned and
+    # LogtailHandler starts a fresh flush thread on the next record; while a
+    # send is stuck it drops records once its buffer is full rather than block
+    def __call__(self, frame):
+        data = msgpack.packb(frame, use_bin_type=True)
+        return self.session.post(self.host, data=data, headers=self.headers, timeout=upload_timeout)
+
 
-# Create a logger and configure it to use both LogtailHandlers
+handler = LogtailHandler(source_token=os.getenv('LOGTAIL_SOURCE_TOKEN'),
+                         buffer_capacity=buffer_capacity, flush_interval=flush_interval)
+handler.uploader = TimeoutUploader(handler.source_token, handler.host)
+handler2 = LogtailHandler(source_token=os.getenv('LOGTAIL_SOURCE_TOKEN_2'),
+                          buffer_capacity=buffer_capacity, flush_interval=flush_interval)
+handler2.uploader = TimeoutUploader(handler2.source_token, handler2.host)
+# Both sources post to the same ingest host, so let them share one connection pool
+handler2.uploader.session = handler.uploader.session
+
+# Hand records to both LogtailHandlers on a background listener thread so the
+# generator loop only pays for a queue put; the queue also carries records
+# across from the generator process
+log_queue = mp_context.Queue()
+listener = logging.handlers.QueueListener(log_queue, handler, handler2, respect_handler_level=True)
+listener.start()
+
+# Create a logger and configure it to feed the listener queue
 logger = logging.getLogger(__name__)
 logger.handlers = []
-logger.setLevel(logging.DEBUG)
-logger.addHandler(handler)
-logger.addHandler(handler2)  # Add the second handler
+logger.setLevel(os.getenv('LOG_LEVEL', 'DEBUG'))
+logger.addHandler(logging.handlers.QueueHandler(log_queue))
+
+# Pools of Faker values, filled once by _build_pools() before the generator
+# starts; picking from these is far cheaper than running the Faker providers
+# for every field of every log
+POOL_SIZE = 10000
+URL_PATH_POOL = []
+IP_POOL = []
+USER_AGENT_POOL = []
+URI_POOL = []
+LANGUAGE_CODE_POOL = []
+MIME_TYPE_POOL = []
+MD5_POOL = []
+
+HTTP_METHODS = ("GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS")
+HTTP_STATUSES = (200, 201, 204, 301, 302, 400, 401, 403, 404, 405, 500, 501, 502, 503)
+HTTP_PROTOCOLS = ("HTTP/1.0", "HTTP/1.1", "HTTP/2")
+
+LEVELS = (logging.DEBUG, logging.INFO, logging.WARNING, logging.ERROR, logging.CRITICAL)
+LEVEL_BATCH_SIZE = 1024
+
+# The timestamp only has second resolution, so format it once per second
+_last_sec = 0
+_last_timestamp = ''
+
+
+def _build_pools():
+    # Faker is only needed here, so keep its import out of processes that never build pools
+    from faker import Faker
+    fake = Faker()
+    URL_PATH_POOL.extend(fake.uri_path(deep=3) for _ in range(POOL_SIZE))
+    IP_POOL.extend(fake.ipv4() for _ in range(POOL_SIZE))
+    USER_AGENT_POOL.extend(fake.user_agent() for _ in range(POOL_SIZE))
+    URI_POOL.extend(fake.uri() for _ in range(POOL_SIZE))
+    LANGUAGE_CODE_POOL.extend(fake.language_code() for _ in range(POOL_SIZE))
+    MIME_TYPE_POOL.extend(fake.mime_type() for _ in range(POOL_SIZE))
+    MD5_POOL.extend(fake.md5() for _ in range(POOL_SIZE))
 
 
 def generate_logs():
     global running
-    global log_count
-    fake = Faker()
+    # Give the worker its own generator and bind its methods once, outside the loop
+    rng = random.Random()
+    choices = rng.choices
+    # isEnabledFor is checked in the loop, so call _log directly and skip
+    # logger.log repeating that check
+    emit = logger._log
+    next_t = time.monotonic()
     while running:
-        log = generate_log(fake)
-
-        log_level = random.choice(['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'])
-        if log_level == 'DEBUG':
-            logger.debug(log)
-        elif log_level == 'INFO':
-            logger.info(log)
-        elif log_level == 'WARNING':
-            logger.warning(log)
-        elif log_level == 'ERROR':
-            logger.error(log)
-        elif log_level == 'CRITICAL':
-            logger.critical(log)
-
-        log_count += 1
-        time.sleep(0.05)  # Pause for 50ms
-
-
-def generate_log(fake):
-    method = random.choice(["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])
-    status = random.choice([200, 201, 204, 301, 302, 400, 401, 403, 404, 405, 500, 501, 502, 503])
-    url = fake.uri_path(deep=3)
-    ip = fake.ipv4()
-    user_agent = fake.user_agent()
-    protocol = random.choice(["HTTP/1.0", "HTTP/1.1", "HTTP/2"])
-    timestamp = time.strftime('%d/%b/%Y:%H:%M:%S %z')
+        # Draw levels a batch at a time rather than one call per log
+        for level in choices(LEVELS, k=LEVEL_BATCH_SIZE):
+            # Only build the log when the logger will actually keep it
+            if logger.isEnabledFor(level):
+                log = generate_log(rng)
+                emit(level, log, ())
+
+                with log_count.get_lock():
+                    log_count.value += 1
+            # Sleep until the next deadline so the rate does not drift with the time spent above
+            next_t += LOG_INTERVAL
+            delay = next_t - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+
+def generate_log(rng):
+    global _last_sec
+    global _last_timestamp
+    choice = rng.choice
+    randrange = rng.randrange
+    method = choice(HTTP_METHODS)
+    status = choice(HTTP_STATUSES)
+    url = choice(URL_PATH_POOL)
+    ip = choice(IP_POOL)
+    user_agent = choice(USER_AGENT_POOL)
+    protocol = choice(HTTP_PROTOCOLS)
+    sec = int(time.time())
+    if sec != _last_sec:
+        _last_timestamp = time.strftime('%d/%b/%Y:%H:%M:%S %z', time.localtime(sec))
+        _last_sec = sec
+    timestamp = _last_timestamp
+    # One urandom read covers both cookie ids
+    cookie_bytes = os.urandom(32)
 
     log_data = {
         'ip': ip,
@@ -66,26 +152,26 @@ def generate_log(fake):
         'status': status,
         'user_agent': user_agent,
         'additional_info': {
-            'user_id': random.randint(1, 100),
-            'referrer': fake.uri(),
-            'response_time': round(random.uniform(0.1, 10.0), 2),
-            'bytes_sent': random.randint(100, 10000),
+            'user_id': randrange(1, 101),
+            'referrer': choice(URI_POOL),
+            'response_time': round(rng.uniform(0.1, 10.0), 2),
+            'bytes_sent': randrange(100, 10001),
             'cookies': {
-                'session_id': fake.uuid4(),
-                'visitor_id': fake.uuid4()
+                'session_id': cookie_bytes[:16].hex(),
+                'visitor_id': cookie_bytes[16:].hex()
             },
             'headers': {
-                'Accept-Language': fake.language_code(),
-                'X-Forwarded-For': fake.ipv4(),
-                'Referer': fake.uri(),
-                'User-Agent': fake.user_agent(),
-                'Content-Type': fake.mime_type(),
-                'Authorization': fake.md5(),
+                'Accept-Language': choice(LANGUAGE_CODE_POOL),
+                'X-Forwarded-For': choice(IP_POOL),
+                'Referer': choice(URI_POOL),
+                'User-Agent': choice(USER_AGENT_POOL),
+                'Content-Type': choice(MIME_TYPE_POOL),
+                'Authorization': choice(MD5_POOL),
             }
         }
     }
 
-    log_line = json.dumps(log_data)
+    log_line = orjson.dumps(log_data).decode()
     return log_line
 
 
@@ -94,5 +180,10 @@ def hello():
     return "Hello, World!"
 
 if __name__ == "__main__":
-    Thread(target=generate_logs).start()
-    app.run(debug=False)
\ No newline at end of file
+    _build_pools()  # Built before forking so the generator process inherits them
+    mp_context.Process(target=generate_logs, daemon=True).start()
+    try:
+        app.run(debug=False)
+    finally:
+        # Stop the listener before exit so the Logtail flush threads send what is left
+        listener.stop()
\ No newline at end of file